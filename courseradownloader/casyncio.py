@@ -1,5 +1,6 @@
 import time
 import os
+import errno
 import sys
 import argparse
 import asyncio
@@ -24,6 +25,14 @@ DoneMessage = namedtuple('DoneMessage', 'size')
 WheelMessage = namedtuple('WheelMessage', 'shape')
 InitialMessage = namedtuple('InitialMessage', 'number')
 FILE_SIZES = ('', 'KB', 'MB', 'GB')
+TEMP_FILE_SUFFIX = '.part'
+DURABILITY_NONE = 'none'
+DURABILITY_COMPLETE = 'complete'
+DURABILITY_PERIODIC = 'periodic'
+DURABILITY_MODES = (DURABILITY_NONE, DURABILITY_COMPLETE, DURABILITY_PERIODIC)
+DEFAULT_FSYNC_INTERVAL = 16 * 1024 * 1024
+IDENTITY_ENCODINGS = (None, 'identity')
+FALLOCATE_UNSUPPORTED_ERRORS = (errno.EOPNOTSUPP, errno.EINVAL)
 
 
 def _print_color_line(text, color, same_line=False, last_string_length=[0]):
@@ -152,10 +161,25 @@ class CourseraParser:
         return urllib.parse.unquote(url)
 
 
+def _fsync_directory(directory):
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
 class FileDownloader:
 
     def __init__(self, directory, url, info_coroutine,
-                 sem, headers=None, cookies=None):
+                 sem, headers=None, cookies=None,
+                 durability=DURABILITY_NONE,
+                 fsync_interval=DEFAULT_FSYNC_INTERVAL):
         self.directory = directory
         self.url = url
         self.cookies = cookies
@@ -163,6 +187,9 @@ class FileDownloader:
         self.fl = None
         self.sem = sem
         self.info_coroutine = info_coroutine
+        self.durability = durability
+        self.fsync_interval = fsync_interval
+        self.unsynced_size = 0
 
     @staticmethod
     def check_filename(filename, content_length=None):
@@ -203,6 +230,7 @@ class FileDownloader:
             self.url = location
             return (yield from self._get_file_name())
         content_length = headers.get("Content-Length")
+        content_encoding = headers.get("Content-Encoding")
         content_disposition = headers.get("Content-Disposition")
         if content_disposition is not None:
             filename = urllib.parse.unquote(
@@ -214,7 +242,7 @@ class FileDownloader:
                 return
             path = urllib.parse.urlsplit(self.url)
             filename = posixpath.basename(path)
-        return filename, content_length
+        return filename, content_length, content_encoding
 
     @asyncio.coroutine
     def start(self):
@@ -225,23 +253,68 @@ class FileDownloader:
                     "Cannot get filename from url {}. Skipped".
                     format(self.url))
                 return
-            filename, content_length = result
+            filename, content_length, content_encoding = result
             filename_path = os.path.normpath(os.path.abspath(
                 os.path.join(self.directory, filename)))
+            temp_path = filename_path + TEMP_FILE_SUFFIX
             if not self.check_filename(filename_path, content_length):
+                self._remove_file(temp_path)
                 send_message(self.info_coroutine, SkippedMessage, filename)
                 return
             self.filename = filename
             try:
-                self.fl = yield from self._open_file(filename_path)
+                self.fl = yield from self._open_file(temp_path)
             except OSError as err:
                 logger.error(
-                    "Cannot open file: {0}. {1}".format(filename_path, err))
+                    "Cannot open file: {0}. {1}".format(temp_path, err))
                 return
-            bytes = yield from self._download_file()
-            if bytes:
-                send_message(
-                    self.info_coroutine, FinishedMessage, filename, bytes)
+            length = self._expected_length(content_length, content_encoding)
+            committed = False
+            try:
+                if not (yield from self._preallocate(length)):
+                    return
+                bytes = yield from self._download_file()
+                if not self._check_size(filename, bytes, length):
+                    return
+                try:
+                    yield from self._commit_file(temp_path, filename_path)
+                except OSError as err:
+                    logger.error(
+                        "Cannot save file: {0}. {1}".format(
+                            filename_path, err))
+                    return
+                committed = True
+            finally:
+                if not committed:
+                    self._discard_file(temp_path)
+            send_message(
+                self.info_coroutine, FinishedMessage, filename, bytes)
+
+    @staticmethod
+    def _expected_length(content_length, content_encoding):
+        # aiohttp decodes compressed bodies, so Content-Length only
+        # matches the saved size for identity responses
+        if content_encoding not in IDENTITY_ENCODINGS:
+            return
+        if content_length is None or not content_length.isdigit():
+            return
+        return int(content_length)
+
+    @staticmethod
+    def _check_size(filename, size, length):
+        if size is None:
+            return False
+        if length is None or size == length:
+            return True
+        if size < length:
+            logger.error(
+                "Truncated download: {0}. Got {1} of {2} bytes".format(
+                    filename, size, length))
+        else:
+            logger.error(
+                "Unexpected size: {0}. Got {1} bytes, expected {2}".format(
+                    filename, size, length))
+        return False
 
     @asyncio.coroutine
     def _download_file(self):
@@ -277,11 +350,64 @@ class FileDownloader:
         finally:
             if response is not None:
                 response.close()
-            self.fl.close()
 
     @asyncio.coroutine
     def _write_to_file(self, chunk):
-        return self.fl.write(chunk)
+        written = self.fl.write(chunk)
+        if self.durability == DURABILITY_PERIODIC:
+            self.unsynced_size += written
+            if self.unsynced_size >= self.fsync_interval:
+                yield from self._sync_file()
+        return written
+
+    @asyncio.coroutine
+    def _sync_file(self):
+        self.fl.flush()
+        self.unsynced_size = 0
+        loop = asyncio.get_event_loop()
+        yield from loop.run_in_executor(None, os.fsync, self.fl.fileno())
+
+    @asyncio.coroutine
+    def _preallocate(self, length):
+        if not hasattr(os, 'posix_fallocate') or not length:
+            return True
+        loop = asyncio.get_event_loop()
+        try:
+            yield from loop.run_in_executor(
+                None, os.posix_fallocate, self.fl.fileno(), 0, length)
+        except OSError as err:
+            if err.errno in FALLOCATE_UNSUPPORTED_ERRORS:
+                logger.debug("Cannot preallocate file: {0}. {1}".format(
+                    self.fl.name, err))
+                return True
+            logger.error(
+                "Cannot preallocate file: {0}. {1}".format(self.fl.name, err))
+            return False
+        return True
+
+    @asyncio.coroutine
+    def _commit_file(self, temp_path, filename):
+        try:
+            if self.durability != DURABILITY_NONE:
+                yield from self._sync_file()
+        finally:
+            self.fl.close()
+        os.replace(temp_path, filename)
+        if self.durability != DURABILITY_NONE:
+            loop = asyncio.get_event_loop()
+            yield from loop.run_in_executor(
+                None, _fsync_directory, os.path.dirname(filename))
+
+    def _discard_file(self, temp_path):
+        self.fl.close()
+        self._remove_file(temp_path)
+
+    @staticmethod
+    def _remove_file(filename):
+        try:
+            os.remove(filename)
+        except OSError:
+            pass
 
     @asyncio.coroutine
     def _open_file(self, filename):
@@ -304,13 +430,31 @@ class Downloader:
     REQUESTS_HEADERS = {"Accept": "*/*", "User-Agent": "coursera-client"}
 
     def __init__(self, classname, username,
-                 password, concurrency, directory, chapter=None):
+                 password, concurrency, directory, chapter=None,
+                 durability=DURABILITY_NONE,
+                 fsync_interval=DEFAULT_FSYNC_INTERVAL):
         self.class_name = classname
         self.username = username
         self.password = password
         self.chapter = chapter
         self.concurrency = concurrency
         self.directory = directory
+        if durability not in DURABILITY_MODES:
+            raise ValueError(
+                "Unknown durability mode: {0}. Expected one of: {1}".format(
+                    durability, ", ".join(DURABILITY_MODES)))
+        try:
+            fsync_interval = int(fsync_interval)
+        except (TypeError, ValueError):
+            raise ValueError(
+                "fsync_interval must be a positive number of bytes, "
+                "got {0}".format(fsync_interval))
+        if fsync_interval <= 0:
+            raise ValueError(
+                "fsync_interval must be a positive number of bytes, "
+                "got {0}".format(fsync_interval))
+        self.durability = durability
+        self.fsync_interval = fsync_interval
         self.auth_cookies = None
         self.info_coroutine = prepare_downloader_info()
 
@@ -401,7 +545,9 @@ class Downloader:
             for link in links:
                 downloader = FileDownloader(
                     directory, link, self.info_coroutine,
-                    headers=self.REQUESTS_HEADERS, cookies=cookies, sem=sem)
+                    headers=self.REQUESTS_HEADERS, cookies=cookies, sem=sem,
+                    durability=self.durability,
+                    fsync_interval=self.fsync_interval)
                 downloaders.append(downloader.start())
         return (yield from asyncio.wait(downloaders))
 
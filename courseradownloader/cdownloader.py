@@ -4,6 +4,8 @@ import os
 import argparse
 import configparser
 from courseradownloader import Downloader, logger
+from courseradownloader.casyncio import (
+    DURABILITY_MODES, DURABILITY_NONE, DEFAULT_FSYNC_INTERVAL)
 
 
 DEFAULT_CONFIG_FILENAME = "coursera.conf"
@@ -99,6 +101,13 @@ def prepare_parser():
                 'Filename is not exists: %s' % filename)
         return filename
 
+    def check_positive(value):
+        value = int(value)
+        if value <= 0:
+            raise argparse.ArgumentTypeError(
+                'Value must be positive: %s' % value)
+        return value
+
     parser.add_argument(
         "-n",
         "--name",
@@ -164,6 +173,28 @@ def prepare_parser():
         type=int,
         help="Number of coroutines to download. Default is 10")
 
+    parser.add_argument(
+        "--durability",
+        required=False,
+        default=DURABILITY_NONE,
+        action="store",
+        dest="durability",
+        choices=DURABILITY_MODES,
+        help="Flush downloaded files to disk: never (none), once the file"
+             " is finished (complete) or every --fsync-interval bytes"
+             " (periodic). Files are written to <name>.part and renamed"
+             " when complete. Default is none")
+
+    parser.add_argument(
+        "--fsync-interval",
+        required=False,
+        default=DEFAULT_FSYNC_INTERVAL,
+        action="store",
+        dest="fsync_interval",
+        type=check_positive,
+        help="Number of bytes written between fsync calls in the periodic"
+             " durability mode. Default is %d" % DEFAULT_FSYNC_INTERVAL)
+
     return parser
 
 
@@ -177,7 +208,13 @@ def main():
     if not check_options(options):
         parser.print_help()
         return
-    Downloader(**options).start()
+    try:
+        downloader = Downloader(**options)
+    except ValueError as err:
+        print("%s\n" % err)
+        parser.print_help()
+        return
+    downloader.start()
 
 
 if __name__ == "__main__":
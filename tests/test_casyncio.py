@@ -0,0 +1,183 @@
+import os
+import errno
+import shutil
+import asyncio
+import tempfile
+import unittest
+from unittest import mock
+
+from courseradownloader import casyncio
+from courseradownloader.casyncio import (
+    Downloader, FileDownloader, DURABILITY_COMPLETE, DURABILITY_PERIODIC,
+    TEMP_FILE_SUFFIX)
+
+
+class FakeContent:
+
+    def __init__(self, body):
+        self.body = body
+        self.position = 0
+
+    @asyncio.coroutine
+    def read(self, size):
+        chunk = self.body[self.position:self.position + size]
+        self.position += len(chunk)
+        return chunk
+
+
+class FakeResponse:
+
+    status = 200
+
+    def __init__(self, body):
+        self.content = FakeContent(body)
+
+    def close(self):
+        pass
+
+
+class FakeFileDownloader(FileDownloader):
+
+    def __init__(self, directory, body, content_length,
+                 content_encoding=None, **kwargs):
+        super().__init__(
+            directory, 'http://example.com/lecture.mp4', None,
+            asyncio.Semaphore(1), **kwargs)
+        self.body = body
+        self.content_length = content_length
+        self.content_encoding = content_encoding
+
+    @asyncio.coroutine
+    def _get_file_name(self):
+        return 'lecture.mp4', self.content_length, self.content_encoding
+
+
+class FileDownloaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'lecture.mp4')
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.fsync = self._patch('os.fsync')
+
+    def tearDown(self):
+        self.loop.close()
+        shutil.rmtree(self.directory)
+
+    def _patch(self, target, **kwargs):
+        patcher = mock.patch(target, **kwargs)
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def _start(self, downloader):
+
+        @asyncio.coroutine
+        def http_request(*args, **kwargs):
+            return FakeResponse(downloader.body)
+
+        with mock.patch.object(casyncio, '_http_request', http_request):
+            self.loop.run_until_complete(downloader.start())
+
+    def _read(self):
+        with open(self.filename, 'rb') as fl:
+            return fl.read()
+
+    def test_commit_on_complete(self):
+        body = b'x' * 5000
+        self._start(FakeFileDownloader(
+            self.directory, body, str(len(body)),
+            durability=DURABILITY_COMPLETE))
+        self.assertEqual(self._read(), body)
+        self.assertFalse(os.path.exists(self.filename + TEMP_FILE_SUFFIX))
+        # the file itself and its directory
+        self.assertEqual(self.fsync.call_count, 2)
+
+    def test_periodic_fsync(self):
+        body = b'x' * 2048 * 10
+        self._start(FakeFileDownloader(
+            self.directory, body, str(len(body)),
+            durability=DURABILITY_PERIODIC, fsync_interval=4096))
+        self.assertEqual(self._read(), body)
+        # every two chunks, then the file and its directory on commit
+        self.assertEqual(self.fsync.call_count, 5 + 2)
+
+    def test_no_fsync_by_default(self):
+        body = b'x' * 5000
+        self._start(FakeFileDownloader(self.directory, body, str(len(body))))
+        self.assertEqual(self._read(), body)
+        self.assertFalse(self.fsync.called)
+
+    @unittest.skipUnless(
+        hasattr(os, 'posix_fallocate'), 'posix_fallocate is not available')
+    def test_preallocate(self):
+        fallocate = self._patch(
+            'os.posix_fallocate', wraps=os.posix_fallocate)
+        body = b'x' * 5000
+        self._start(FakeFileDownloader(self.directory, body, str(len(body))))
+        self.assertEqual(fallocate.call_count, 1)
+        self.assertEqual(fallocate.call_args[0][1:], (0, len(body)))
+        self.assertEqual(os.path.getsize(self.filename), len(body))
+        self.assertEqual(self._read(), body)
+
+    @unittest.skipUnless(
+        hasattr(os, 'posix_fallocate'), 'posix_fallocate is not available')
+    def test_preallocate_unsupported(self):
+        self._patch(
+            'os.posix_fallocate',
+            side_effect=OSError(errno.EOPNOTSUPP, 'not supported'))
+        self._start(FakeFileDownloader(self.directory, b'data', '4'))
+        self.assertEqual(self._read(), b'data')
+
+    @unittest.skipUnless(
+        hasattr(os, 'posix_fallocate'), 'posix_fallocate is not available')
+    def test_preallocate_no_space(self):
+        self._patch(
+            'os.posix_fallocate',
+            side_effect=OSError(errno.ENOSPC, 'no space left'))
+        self._start(FakeFileDownloader(self.directory, b'data', '4'))
+        self.assertFalse(os.path.exists(self.filename))
+        self.assertFalse(os.path.exists(self.filename + TEMP_FILE_SUFFIX))
+
+    def test_commit_empty_body(self):
+        self._start(FakeFileDownloader(self.directory, b'', '0'))
+        self.assertEqual(os.path.getsize(self.filename), 0)
+
+    def test_commit_encoded_body(self):
+        fallocate = self._patch('os.posix_fallocate', create=True)
+        self._start(FakeFileDownloader(
+            self.directory, b'decoded data', '4', content_encoding='gzip'))
+        self.assertEqual(self._read(), b'decoded data')
+        self.assertFalse(fallocate.called)
+
+    def test_discard_on_short_body(self):
+        self._start(FakeFileDownloader(self.directory, b'da', '4'))
+        self.assertFalse(os.path.exists(self.filename))
+        self.assertFalse(os.path.exists(self.filename + TEMP_FILE_SUFFIX))
+
+    def test_remove_stale_temp_file_on_skip(self):
+        with open(self.filename, 'wb') as fl:
+            fl.write(b'data')
+        with open(self.filename + TEMP_FILE_SUFFIX, 'wb') as fl:
+            fl.write(b'da')
+        self._start(FakeFileDownloader(self.directory, b'data', '4'))
+        self.assertFalse(os.path.exists(self.filename + TEMP_FILE_SUFFIX))
+
+
+class DownloaderTest(unittest.TestCase):
+
+    def _downloader(self, **kwargs):
+        return Downloader(
+            'classname', 'username', 'password', 1, '.', **kwargs)
+
+    def test_invalid_durability(self):
+        self.assertRaises(ValueError, self._downloader, durability='fsync')
+
+    def test_invalid_fsync_interval(self):
+        self.assertRaises(ValueError, self._downloader, fsync_interval='0')
+        with self.assertRaisesRegex(ValueError, 'fsync_interval'):
+            self._downloader(fsync_interval='x')
+
+
+if __name__ == '__main__':
+    unittest.main()